@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+#
+# Benchmarks for the lecroy module.
+#
+# Usage:
+#   python benchmark.py header FILE [FILE ...]
+#   python benchmark.py many [--file FILE] [--size N] [--copies N] [--workers N [N ...]]
+#   python benchmark.py scope FILE [--channels N] [--rounds N] [--frame-size N]
+#   python benchmark.py measure FILE [--segments N] [--block-segments N]
+#   python benchmark.py suite [--sizes N [N ...]]
+#
+# Each benchmark prints the mean time per file, so results from different machines and
+# different sets of files can be compared directly.
+#
+# The suite needs no data: it writes a synthetic corpus with lecroy.WriteBinaryTrace and
+# prints the time of every stage of the reader. The same stages are timed with
+# pytest-benchmark by test_benchmark.py, which saves and compares runs, e.g. in CI:
+#   pytest test_benchmark.py --benchmark-autosave
+#   pytest test_benchmark.py --benchmark-compare --benchmark-compare-fail=mean:25%
+#
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import lecroy
+#
+#
+def timeit(func, args, repeat):
+    """
+    Calls func(arg) for every arg in args, repeat times. Returns the best mean time per
+    call in seconds.
+    """
+    best = float('inf')
+    for r in range(repeat):
+        t0 = time.perf_counter()
+        for a in args:
+            func(a)
+        best = min(best, (time.perf_counter()-t0)/len(args))
+    return best
+#
+#
+def fieldByField(filePath):
+    """
+    Reference header reader: one np.fromfile call per WAVEDESC field, as done by
+    ReadBinaryTrace up to version 1.5.
+    """
+    with open(filePath, 'rb') as dataFile:
+        startOffset = dataFile.read(32).find(b'WAVEDESC')
+        dataFile.seek(startOffset+34)
+        co = ('>','<')[np.fromfile(dataFile,dtype='<i2',count=1)[0]]
+        dataFile.seek(startOffset)
+        for name,fmt in lecroy._WAVEDESC_LAYOUT:
+            if fmt[-1]=='s': dataFile.read(int(fmt[:-1]))
+            else: np.fromfile(dataFile,dtype=co+fmt,count=1)[0]
+#
+#
+def benchHeader(files, repeat):
+    tOld = timeit(fieldByField, files, repeat)
+    tNew = timeit(lecroy.ReadWaveDesc, files, repeat)
+    tFull = timeit(lecroy.ReadBinaryTrace, files, repeat)
+    print('Header parse, %d files' % len(files))
+    print('  field by field   %10.1f us/file' % (tOld*1e6))
+    print('  ReadWaveDesc     %10.1f us/file  (%.1fx)' % (tNew*1e6, tOld/tNew))
+    print('  ReadBinaryTrace  %10.1f us/file' % (tFull*1e6))
+#
+#
+def benchMany(filePath, size, copies, workers, repeat):
+    """
+    Reads a synthetic corpus made of copies of a trace, serially and with read_many and
+    read_stacked for each number of workers. The trace is filePath, or if None a trace 
+    of size bytes of samples written by writeSynthetic.
+    """
+    tmp = tempfile.mkdtemp()
+    try:
+        if filePath is None:
+            filePath = os.path.join(tmp, 'synthetic.trc')
+            writeSynthetic(filePath, size, 'word', 'LOFIRST', False, 1)
+        files = []
+        for i in range(copies):
+            files.append(os.path.join(tmp, 'C%d--bench--%05d.trc' % (i % 4 + 1, i)))
+            shutil.copyfile(filePath, files[-1])
+        print('Batch read, %d files of %d bytes' % (copies, os.path.getsize(filePath)))
+        tSerial = timeit(lambda f: [lecroy.ReadBinaryTrace(p) for p in f], [files], repeat)
+        print('  serial loop                %8.3f s' % tSerial)
+        for executor in ('thread','process'):
+            for n in workers:
+                t = timeit(lambda f: list(lecroy.read_many(f, n, executor)), [files], repeat)
+                print('  read_many    %-7s x%-3d  %8.3f s  (%.1fx)' % (executor, n, t, tSerial/t))
+                t = timeit(lambda f: lecroy.read_stacked(f, n, executor), [files], repeat)
+                print('  read_stacked %-7s x%-3d  %8.3f s  (%.1fx)' % (executor, n, t, tSerial/t))
+    finally:
+        shutil.rmtree(tmp)
+#
+#
+def benchScope(filePath, channels, rounds, frameSize, repeat):
+    """
+    Reads filePath from a FakeScope on every channel, with and without pipelining of the
+    requests, and through acquire with a queue. Prints the throughput and the latency 
+    of a round (all channels).
+    """
+    names = ['C%d' % (i+1) for i in range(channels)]
+    size = os.path.getsize(filePath)
+    async def rounds_(pipeline):
+        async with lecroy.FakeScope({n:filePath for n in names}, frame_size=frameSize) as scope:
+            async with await lecroy.ScopeClient.connect(scope.host, scope.port) as client:
+                latency = []
+                for r in range(rounds):
+                    t0 = time.perf_counter()
+                    await client.fetch(names, pipeline, mode='raw')
+                    latency.append(time.perf_counter()-t0)
+                return latency
+    async def queued():
+        async with lecroy.FakeScope({n:filePath for n in names}, frame_size=frameSize) as scope:
+            queue = asyncio.Queue(maxsize=2*channels)
+            task = asyncio.create_task(lecroy.acquire(scope.host, names, queue, port=scope.port, count=rounds, mode='raw'))
+            for i in range(rounds*channels):
+                await queue.get()
+            await task
+    print('Scope acquisition, %d channels x %d bytes, %d rounds' % (channels, size, rounds))
+    for pipeline in (False, True):
+        best = None
+        for r in range(repeat):
+            latency = asyncio.run(rounds_(pipeline))
+            if best is None or sum(latency)<sum(best): best = latency
+        total = sum(best)
+        print('  %-12s %8.1f MB/s  %8.1f rounds/s  latency median %7.2f ms  max %7.2f ms' % (
+            ('pipelined' if pipeline else 'sequential'), rounds*channels*size/total/1e6, 
+            rounds/total, np.median(best)*1e3, max(best)*1e3))
+    t = timeit(lambda a: asyncio.run(queued()), [None], repeat)
+    print('  %-12s %8.1f MB/s  %8.1f rounds/s' % ('acquire', rounds*channels*size/t/1e6, rounds/t))
+#
+#
+def naiveMeasure(y, x, low=0.1, high=0.9):
+    """
+    Reference measurements: a Python loop over segments and over samples, as done 
+    before lecroy.measure. Returns (amplitude, rise_time, crossing, area) per segment.
+    """
+    results = []
+    for s,t in zip(y,x):
+        s = s.astype('float64')
+        base, top = s.min(), s.max()
+        amplitude = top-base
+        def cross(level, start=0):
+            for i in range(start,len(s)-1):
+                if s[i]<level<=s[i+1]:
+                    return t[i]+(level-s[i])/(s[i+1]-s[i])*(t[i+1]-t[i]), i
+            return np.nan, len(s)
+        t0, i0 = cross(base+low*amplitude)
+        t1, i1 = cross(base+high*amplitude, i0)
+        tc, ic = cross(base+0.5*amplitude)
+        results.append((amplitude, t1-t0, tc, np.trapezoid(s,t)))
+    return np.array(results)
+#
+#
+def benchMeasure(filePath, segments, blockSegments, repeat):
+    """
+    Measures the segments of a sequence file with a Python loop (on the first segments 
+    only), with measure on the whole array and with measure_file. Prints the time per
+    segment.
+    """
+    WAVEDESC, text, x, y, y2 = lecroy.ReadBinaryTrace(filePath)
+    n = min(segments, len(y))
+    print('Segment measurements, %d segments of %d points' % (len(y), y.shape[1]))
+    tNaive = timeit(lambda a: naiveMeasure(y[:n], x[:n]), [None], 1)/n
+    print('  %-28s %8.2f us/segment' % ('naive loop (%d segments)' % n, tNaive*1e6))
+    t = timeit(lambda a: lecroy.measure(y, x), [None], repeat)/len(y)
+    print('  %-28s %8.2f us/segment  (%.0fx)' % ('measure', t*1e6, tNaive/t))
+    t = timeit(lambda a: lecroy.measure_file(filePath, blockSegments), [None], repeat)/len(y)
+    print('  %-28s %8.2f us/segment  (%.0fx)' % ('measure_file (read, scale)', t*1e6, tNaive/t))
+#
+#
+# Kinds of traces of the synthetic corpus: (name, COMM_TYPE, COMM_ORDER, dual, segments)
+SUITE_KINDS = [
+    ('word-lo',    'word', 'LOFIRST', False, 1),
+    ('word-hi',    'word', 'HIFIRST', False, 1),
+    ('byte-lo',    'byte', 'LOFIRST', False, 1),
+    ('byte-hi',    'byte', 'HIFIRST', False, 1),
+    ('dual',       'word', 'LOFIRST', True,  1),
+    ('sequence',   'word', 'LOFIRST', False, 1000),
+    ('sequence-b', 'byte', 'HIFIRST', False, 1000),
+]
+#
+#
+class TiledArray:
+    """
+    Read-only 1-D array of npts samples made of repetitions of block, multiplied by sign.
+    Slices are computed on demand, so that WriteBinaryTrace converts it block by block
+    without materializing the whole array.
+    """
+    def __init__(self, block, npts, sign=1):
+        self.block, self.sign = block, sign
+        self.shape, self.dtype = (npts,), block.dtype
+    def __len__(self):
+        return self.shape[0]
+    def __getitem__(self, key):
+        start, stop, step = key.indices(self.shape[0])
+        index = np.arange(start, stop, step) % len(self.block)
+        return self.block[index]*self.dtype.type(self.sign)
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+#
+#
+def writeSynthetic(filePath, size, commType, commOrder, dual, segments):
+    """
+    Writes a trace of about size bytes of samples. The samples are a noisy sine block,
+    repeated (TiledArray) or broadcast over the segments, so that traces larger than
+    memory can be written. Returns the raw samples (y1, y2) that were written.
+    """
+    dtype = ('i1','i2')[commType=='word']
+    itemsize = np.dtype(dtype).itemsize
+    npts = max(2, size//itemsize//(segments*(1+dual)))
+    block = min(npts, 1048576)
+    rng = np.random.default_rng(0)
+    y = 100*np.sin(np.arange(block)*2*np.pi/block*5)+rng.normal(0,3,block)
+    y = y.astype(dtype)
+    if segments>1: y1 = np.broadcast_to(y[:npts], (segments,npts))
+    else: y1 = TiledArray(y, npts)
+    y2 = TiledArray(y, npts, -1) if dual else None
+    lecroy.WriteBinaryTrace(filePath, y1, y2, COMM_ORDER=commOrder, COMM_TYPE=commType,
+                            VERTICAL_GAIN=0.01, VERTICAL_OFFSET=0.5, HORIZ_INTERVAL=1e-9,
+                            HORIZ_OFFSET=-1e-6)
+    return y1, y2
+#
+#
+def benchSuite(sizes, repeat):
+    """
+    Runs the stage benchmarks on the synthetic corpus: header parse (ReadWaveDesc) and 
+    the stages of ReadBinaryTrace recorded by ReadStats (data read, scaling, time axis),
+    for every kind of trace and size. Prints the best time of each stage, in ms per 
+    file, and the bytes and read calls per file.
+    """
+    tmp = tempfile.mkdtemp()
+    try:
+        print('%-24s %9s %9s %9s %9s %9s %6s' % ('trace', 'header', 'data', 'scale', 'axis', 'MB/s', 'reads'))
+        for size in sizes:
+            for name,commType,commOrder,dual,segments in SUITE_KINDS:
+                filePath = os.path.join(tmp, '%s-%d.trc' % (name, size))
+                writeSynthetic(filePath, size, commType, commOrder, dual, segments)
+                key = '%s/%d' % (name, size)
+                header = timeit(lecroy.ReadWaveDesc, [filePath]*10, repeat)
+                best = None
+                for r in range(repeat):
+                    stats = lecroy.ReadStats()
+                    lecroy.ReadBinaryTrace(filePath, stats=stats)
+                    if best is None or sum(stats.times.values())<sum(best.times.values()):
+                        best = stats
+                total = sum(best.times.values())
+                print('%-24s %9.3f %9.3f %9.3f %9.3f %9.1f %6d' % (key, header*1e3,
+                      best.times['data']*1e3, best.times['scale']*1e3, best.times['axis']*1e3,
+                      best.bytes_read/total/1e6, best.read_calls))
+                os.remove(filePath)
+    finally:
+        shutil.rmtree(tmp)
+#
+#
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the lecroy module')
+    parser.add_argument('--repeat', type=int, default=5, help='number of repetitions')
+    sub = parser.add_subparsers(dest='bench', required=True)
+    p = sub.add_parser('header', help='WAVEDESC parsing speed')
+    p.add_argument('files', nargs='+')
+    p = sub.add_parser('many', help='parallel batch loading')
+    p.add_argument('--file', help='file copied to build the corpus (default: a synthetic trace)')
+    p.add_argument('--size', type=int, default=10**6, help='bytes of samples of the synthetic trace')
+    p.add_argument('--copies', type=int, default=1000, help='number of files in the corpus')
+    p.add_argument('--workers', type=int, nargs='+', default=[1,2,4,8])
+    p = sub.add_parser('scope', help='acquisition from a (fake) scope over VICP')
+    p.add_argument('file', help='file replayed by the fake scope on every channel')
+    p.add_argument('--channels', type=int, default=4)
+    p.add_argument('--rounds', type=int, default=100)
+    p.add_argument('--frame-size', type=int, default=1048576, help='VICP frame size in bytes')
+    p = sub.add_parser('measure', help='per-segment measurements of a sequence file')
+    p.add_argument('file')
+    p.add_argument('--segments', type=int, default=1000, help='segments measured by the naive loop')
+    p.add_argument('--block-segments', type=int, default=4096, help='segments per block of measure_file')
+    p = sub.add_parser('suite', help='stage benchmarks on a synthetic corpus')
+    p.add_argument('--sizes', type=int, nargs='+', default=[10**4,10**6,10**8], help='bytes of samples per trace')
+    args = parser.parse_args()
+    if args.bench == 'header':
+        benchHeader(args.files, args.repeat)
+    elif args.bench == 'many':
+        benchMany(args.file, args.size, args.copies, args.workers, args.repeat)
+    elif args.bench == 'scope':
+        benchScope(args.file, args.channels, args.rounds, args.frame_size, args.repeat)
+    elif args.bench == 'measure':
+        benchMeasure(args.file, args.segments, args.block_segments, args.repeat)
+    elif args.bench == 'suite':
+        benchSuite(args.sizes, args.repeat)
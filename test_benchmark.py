@@ -0,0 +1,71 @@
+#
+# Benchmarks of the lecroy reader with pytest-benchmark, on the synthetic corpus of
+# benchmark.py (SUITE_KINDS). Every benchmark times a public call: the header parse
+# (ReadWaveDesc), the default read (np.fromfile, scaling and time axis), the raw,
+# dtype/out and bytes paths of ReadBinaryTrace. The time of each stage of the read
+# (see ReadStats) is saved with the results, as extra_info.
+#
+# Usage:
+#   pytest test_benchmark.py --benchmark-autosave
+#   pytest test_benchmark.py --benchmark-compare --benchmark-compare-fail=mean:25%
+#
+# The second command fails if a benchmark is more than 25% slower than in the last
+# saved run. LECROY_BENCH_SIZE sets the bytes of samples per trace (default: 10**6).
+#
+import os
+import numpy as np
+import pytest
+import lecroy
+from benchmark import SUITE_KINDS, writeSynthetic
+pytest.importorskip('pytest_benchmark')
+#
+#
+SIZE = int(os.environ.get('LECROY_BENCH_SIZE', 10**6))
+#
+#
+@pytest.fixture(scope='module', params=SUITE_KINDS, ids=[kind[0] for kind in SUITE_KINDS])
+def trace(request, tmp_path_factory):
+    name,commType,commOrder,dual,segments = request.param
+    filePath = str(tmp_path_factory.mktemp('bench') / ('%s-%d.trc' % (name, SIZE)))
+    writeSynthetic(filePath, SIZE, commType, commOrder, dual, segments)
+    return filePath
+#
+#
+def readStages(benchmark, source, **kwargs):
+    """
+    Benchmarks ReadBinaryTrace(source, **kwargs), and saves the mean time of each stage
+    per call in benchmark.extra_info.
+    """
+    stats = lecroy.ReadStats()
+    benchmark(lecroy.ReadBinaryTrace, source, stats=stats, **kwargs)
+    for stage,seconds in stats.times.items():
+        benchmark.extra_info['time_'+stage] = seconds/max(stats.traces,1)
+    benchmark.extra_info['read_calls'] = stats.read_calls/max(stats.traces,1)
+#
+#
+def test_header(benchmark, trace):
+    benchmark.group = 'header'
+    benchmark(lecroy.ReadWaveDesc, trace)
+#
+#
+def test_read(benchmark, trace):
+    benchmark.group = 'read'
+    readStages(benchmark, trace)
+#
+#
+def test_read_raw(benchmark, trace):
+    benchmark.group = 'read raw'
+    readStages(benchmark, trace, mode='raw')
+#
+#
+def test_read_out(benchmark, trace):
+    # Scaling into a reused float32 buffer, without time axis
+    benchmark.group = 'read out'
+    shape = lecroy.ReadBinaryTrace(trace, mode='raw')[3].shape
+    readStages(benchmark, trace, out=np.empty(shape, dtype='float32'), x_out=False)
+#
+#
+def test_read_bytes(benchmark, trace):
+    benchmark.group = 'read bytes'
+    with open(trace, 'rb') as f: data = f.read()
+    readStages(benchmark, data)
@@ -0,0 +1,618 @@
+#
+# Tests of the lecroy module.
+#
+# Usage:
+#   python -m pytest test_lecroy.py
+#
+# Traces are written by makeTrace, which packs the WAVEDESC block from _WAVEDESC_LAYOUT
+# independently of the reader.
+#
+import asyncio
+import io
+import os
+import struct
+import numpy as np
+import pytest
+import lecroy
+from benchmark import SUITE_KINDS, writeSynthetic
+#
+#
+def makeTrace(filePath, y1, y2=None, order='<', trigTime=None, text=b'', header=True, blocks={}, **fields):
+    """
+    Writes a trace of template LECROY_2_3 with the raw samples y1 (1-D, or 2-D for a
+    sequence acquisition) and y2, with byte order order ('<' or '>'). blocks gives the
+    lengths of the optional blocks RES_DESC1, RIS_TIME_ARRAY, RES_ARRAY1 (and of
+    TRIGTIME_ARRAY for a single sweep), which are filled with 0x7f bytes. Other header
+    fields are given by name, e.g. VERTICAL_GAIN=0.5. Returns the bytes written.
+    """
+    y1 = np.asarray(y1)
+    rawType = np.dtype(order+y1.dtype.str[1:])
+    segments = y1.shape[0] if y1.ndim==2 else 1
+    npts = y1.shape[-1]
+    d = dict(DESCRIPTOR_NAME=b'WAVEDESC',TEMPLATE_NAME=b'LECROY_2_3',
+             COMM_TYPE_INDEX=int(rawType.itemsize==2),COMM_ORDER_INDEX=int(order=='<'),
+             WAVE_DESCRIPTOR=346,USER_TEXT=len(text),RES_DESC1=0,RIS_TIME_ARRAY=0,RES_ARRAY1=0,
+             TRIGTIME_ARRAY=16*segments if segments>1 else 0,
+             WAVE_ARRAY_1=y1.size*rawType.itemsize,
+             WAVE_ARRAY_2=0 if y2 is None else y1.size*rawType.itemsize,
+             INSTRUMENT_NAME=b'LECROYWR8000',WAVE_ARRAY_COUNT=y1.size,PNTS_PER_SCREEN=npts,
+             LAST_VALID_PNT=npts-1,SUBARRAY_COUNT=segments,NOM_SUBARRAY_COUNT=min(segments,32767),
+             VERTICAL_GAIN=0.01,VERTICAL_OFFSET=0.25,NOMINAL_BITS=8,HORIZ_INTERVAL=1e-9,
+             HORIZ_OFFSET=-5e-7,VERTUNIT=b'V',HORUNIT=b'S',TRIGGER_TIME_SECONDS=12.5,
+             TRIGGER_TIME_MINUTES=30,TRIGGER_TIME_HOURS=10,TRIGGER_TIME_DAYS=16,
+             TRIGGER_TIME_MONTHS=10,TRIGGER_TIME_YEAR=2026,PROBE_ATT=1.0,VERTICAL_VERNIER=1.0)
+    d.update(blocks)
+    d.update(fields)
+    head = struct.pack(order+''.join(fmt for name,fmt in lecroy._WAVEDESC_LAYOUT),
+                       *[d.get(name,b'' if fmt[-1]=='s' else 0) for name,fmt in lecroy._WAVEDESC_LAYOUT])
+    if segments>1:
+        if trigTime is None:
+            trigTime = np.column_stack([np.arange(segments)*1e-3,np.full(segments,-5e-7)])
+        trig = np.asarray(trigTime,dtype=order+'f8').tobytes()
+    else:
+        trig = b'\x7f'*d['TRIGTIME_ARRAY']
+    body = (head+text+b'\x7f'*d['RES_DESC1']+trig+b'\x7f'*d['RIS_TIME_ARRAY']+
+            b'\x7f'*d['RES_ARRAY1']+y1.astype(rawType).tobytes())
+    if y2 is not None: body += np.asarray(y2).astype(rawType).tobytes()
+    data = b'#9%09d' % len(body)+body if header else body
+    with open(filePath,'wb') as f: f.write(data)
+    return data
+#
+#
+def scaled(raw, WAVEDESC):
+    return raw*WAVEDESC['VERTICAL_GAIN']-WAVEDESC['VERTICAL_OFFSET']
+#
+#
+SEQUENCE = np.arange(-2500,2500,dtype='i2').reshape(50,100)
+# Optional blocks that precede the data arrays
+BLOCKS = dict(RES_DESC1=4,RIS_TIME_ARRAY=8,RES_ARRAY1=2)
+#
+#
+# WAVEDESC parsing
+#
+@pytest.mark.parametrize('order', ['<','>'])
+@pytest.mark.parametrize('rawType', ['i1','i2'])
+@pytest.mark.parametrize('header', [True,False])
+def test_wavedesc(tmp_path, order, rawType, header):
+    filePath = str(tmp_path / 'trace.trc')
+    y = np.arange(-100,100).astype(rawType)
+    data = makeTrace(filePath,y,order=order,text=b'hello',header=header)
+    WAVEDESC = lecroy.ReadWaveDesc(filePath)
+    assert WAVEDESC['COMM_TYPE']==('byte','word')[rawType=='i2']
+    assert WAVEDESC['COMM_ORDER']==('HIFIRST','LOFIRST')[order=='<']
+    assert WAVEDESC['TEMPLATE_NAME']=='LECROY_2_3'
+    assert WAVEDESC['INSTRUMENT_NAME']=='LECROYWR8000'
+    assert WAVEDESC['WAVE_ARRAY_COUNT']==200
+    assert WAVEDESC['VERTICAL_GAIN']==pytest.approx(0.01)
+    assert WAVEDESC['HORIZ_OFFSET']==-5e-7
+    assert WAVEDESC['TRIGGER_TIME']==(12.5,30,10,16,10,2026,0)
+    assert WAVEDESC['WAVE_SOURCE']=='C1'
+    assert WAVEDESC['FILE_SIZE']==len(data)-11*header
+    W,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    assert W==WAVEDESC
+    assert TEXT==b'hello'
+    np.testing.assert_array_equal(y1,scaled(y,WAVEDESC))
+    np.testing.assert_allclose(x,np.arange(200)*1e-9-5e-7,rtol=1e-6)
+    assert y2.size==0
+#
+#
+def test_dual_and_sequence(tmp_path):
+    filePath = str(tmp_path / 'dual.trc')
+    y = np.arange(100,dtype='i2')
+    makeTrace(filePath,y,-y,order='>')
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    np.testing.assert_array_equal(y1,scaled(y,WAVEDESC))
+    np.testing.assert_array_equal(y2,scaled(-y,WAVEDESC))
+    filePath = str(tmp_path / 'sequence.trc')
+    makeTrace(filePath,SEQUENCE)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    assert y1.shape==x.shape==(50,100)
+    np.testing.assert_array_equal(y1,scaled(SEQUENCE,WAVEDESC))
+    np.testing.assert_allclose(x[:,0],np.arange(50)*1e-3-5e-7)
+#
+#
+def test_not_a_trace(tmp_path):
+    filePath = str(tmp_path / 'garbage.trc')
+    with open(filePath,'wb') as f: f.write(b'not a trace'*100)
+    with pytest.raises(RuntimeError):
+        lecroy.ReadWaveDesc(filePath)
+    makeTrace(filePath,np.arange(10,dtype='i2'),TEMPLATE_NAME=b'LECROY_2_2')
+    with pytest.raises(RuntimeError):
+        lecroy.ReadBinaryTrace(filePath)
+#
+#
+# Raw mode
+#
+def test_raw(tmp_path):
+    filePath = str(tmp_path / 'raw.trc')
+    y = np.arange(-100,100,dtype='i1')
+    makeTrace(filePath,y,y[::-1],order='>')
+    WAVEDESC,TEXT,(interval,horOffset),y1,y2 = lecroy.ReadBinaryTrace(filePath,mode='raw')
+    assert isinstance(y1,np.memmap) and not y1.flags.writeable
+    np.testing.assert_array_equal(y1,y)
+    np.testing.assert_array_equal(y2,y[::-1])
+    assert (interval,horOffset)==(WAVEDESC['HORIZ_INTERVAL'],WAVEDESC['HORIZ_OFFSET'])
+    filePath = str(tmp_path / 'sequence.trc')
+    makeTrace(filePath,SEQUENCE,order='>')
+    WAVEDESC,TEXT,(interval,horOffset),y1,y2 = lecroy.ReadBinaryTrace(filePath,mode='raw')
+    assert y1.dtype==np.dtype('>i2')
+    np.testing.assert_array_equal(y1,SEQUENCE)
+    np.testing.assert_allclose(horOffset,np.arange(50)*1e-3-5e-7)
+    with pytest.raises(ValueError):
+        lecroy.ReadBinaryTrace(filePath,mode='fast')
+#
+#
+@pytest.mark.parametrize('y', [np.arange(5,dtype='i2'),SEQUENCE[:3,:5]], ids=['single','sequence'])
+def test_optional_blocks(tmp_path, y):
+    # All the read paths find the data arrays after the optional blocks
+    filePath = str(tmp_path / 'blocks.trc')
+    blocks = dict(BLOCKS,TRIGTIME_ARRAY=16) if y.ndim==1 else BLOCKS
+    makeTrace(filePath,y,None if y.ndim==2 else y+10,blocks=blocks)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    np.testing.assert_array_equal(y1,scaled(y,WAVEDESC))
+    if y.ndim==1: np.testing.assert_array_equal(y2,scaled(y+10,WAVEDESC))
+    else: np.testing.assert_allclose(x[:,0],np.arange(3)*1e-3-5e-7)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath,mode='raw')
+    np.testing.assert_array_equal(y1,y)
+#
+#
+# Trace objects
+#
+def test_open(tmp_path):
+    filePath = str(tmp_path / 'trace.trc')
+    y = np.arange(-500,500,dtype='i2')
+    makeTrace(filePath,y)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    trace = lecroy.open(filePath)
+    assert trace.y1.shape==trace.x.shape==(1000,)
+    np.testing.assert_array_equal(trace.y1[10:20],y1[10:20])
+    np.testing.assert_array_equal(np.asarray(trace.y1),y1)
+    np.testing.assert_allclose(np.asarray(trace.x),x)
+    np.testing.assert_allclose(trace.x[[0,5,-1]],x[[0,5,-1]])
+    assert trace.y2.size==0
+    i = trace.x.searchsorted(x[100])
+    assert i==100 and trace.x.searchsorted(x[100],'right')==101
+    assert trace.x.time_to_index(x[100]+0.4e-9)==100
+    t, y = trace.window(x[100],x[200])
+    np.testing.assert_allclose(t,x[100:200])
+    np.testing.assert_array_equal(y,y1[100:200])
+#
+#
+def test_open_sequence(tmp_path):
+    filePath = str(tmp_path / 'sequence.trc')
+    makeTrace(filePath,SEQUENCE)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    trace = lecroy.open(filePath)
+    assert trace.x.shape==(50,100)
+    np.testing.assert_allclose(trace.x[7],x[7])
+    np.testing.assert_allclose(trace.x[:,10:20],x[:,10:20])
+    np.testing.assert_array_equal(trace.y1[3,5:9],y1[3,5:9])
+    t, y = trace.window(x[4,10],x[4,20],segment=4)
+    np.testing.assert_array_equal(y,y1[4,10:20])
+    with pytest.raises(ValueError):
+        trace.window(x[4,10],x[4,20])
+#
+#
+# Segment selection
+#
+def test_segments(tmp_path):
+    filePath = str(tmp_path / 'sequence.trc')
+    trigTime = np.column_stack([np.arange(50)*1e-3,np.full(50,-1e-6)])
+    makeTrace(filePath,SEQUENCE,trigTime=trigTime)
+    for segments,index in ((slice(10,20),np.arange(10,20)),(5,[5]),(-1,[49]),([3,1,7],[3,1,7]),
+                           (np.arange(50)%2==0,np.arange(0,50,2)),([],[])):
+        WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath,mode='raw',segments=segments)
+        np.testing.assert_array_equal(y1,SEQUENCE[index].reshape(-1,100))
+        np.testing.assert_allclose(x[1],trigTime[index,0]+trigTime[index,1])
+        WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath,segments=segments)
+        assert y1.shape==x.shape==(len(index),100)
+        np.testing.assert_array_equal(y1,scaled(SEQUENCE[index].reshape(-1,100),WAVEDESC))
+        np.testing.assert_allclose(x,np.arange(100)*1e-9+(trigTime[index,0]+trigTime[index,1])[:,None])
+    with pytest.raises(IndexError):
+        lecroy.ReadBinaryTrace(filePath,segments=50)
+    makeTrace(filePath,np.arange(10,dtype='i2'))
+    with pytest.raises(ValueError):
+        lecroy.ReadBinaryTrace(filePath,segments=[0])
+#
+#
+# Streaming reader
+#
+@pytest.mark.parametrize('y', [np.arange(-500,500,dtype='i2'),SEQUENCE], ids=['single','sequence'])
+def test_iter_chunks(tmp_path, y):
+    filePath = str(tmp_path / 'trace.trc')
+    makeTrace(filePath,y,None if y.ndim==2 else -y,blocks=BLOCKS)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    chunks = list(lecroy.iter_chunks(filePath,chunk_points=77))
+    assert max(len(c) for t,c in chunks)==77
+    np.testing.assert_array_equal(np.concatenate([c for t,c in chunks]),y1.ravel())
+    np.testing.assert_allclose(np.concatenate([t for t,c in chunks]),x.ravel())
+    if y.ndim==1:
+        chunks = list(lecroy.iter_chunks(filePath,chunk_points=77,channel='y2'))
+        np.testing.assert_array_equal(np.concatenate([c for t,c in chunks]),y2)
+    else:
+        with pytest.raises(ValueError):
+            list(lecroy.iter_chunks(filePath,channel='y2'))
+#
+#
+def test_truncated(tmp_path):
+    filePath = str(tmp_path / 'truncated.trc')
+    makeTrace(filePath,np.arange(1000,dtype='i2'))
+    with open(filePath,'r+b') as f: f.truncate(os.path.getsize(filePath)-10)
+    with pytest.raises(RuntimeError):
+        list(lecroy.iter_chunks(filePath,chunk_points=100))
+    with pytest.raises(ValueError):
+        list(lecroy.iter_chunks(filePath,chunk_points=0))
+#
+#
+# Batch loaders
+#
+def test_group_traces():
+    assert lecroy.parse_trace_name('/data/C2--run--00012.trc')==('C2','run',12)
+    assert lecroy.parse_trace_name('scope.trc') is None
+    groups = lecroy.group_traces(['C1--a--00002.trc','C1--a--00001.trc','C2--a--00001.trc','x.trc'])
+    assert groups=={('C1','a'):['C1--a--00001.trc','C1--a--00002.trc'],
+                    ('C2','a'):['C2--a--00001.trc'],(None,'x'):['x.trc']}
+#
+#
+@pytest.fixture
+def corpus(tmp_path):
+    """
+    Files of two groups (C1 and C2), with different samples.
+    """
+    paths = []
+    for i in range(6):
+        paths.append(str(tmp_path / ('C%d--run--%05d.trc' % (i%2+1,i))))
+        makeTrace(paths[-1],np.arange(100,dtype='i2')*(i+1))
+    return paths
+#
+#
+@pytest.mark.parametrize('executor', ['thread','process'])
+def test_read_many(corpus, executor):
+    results = list(lecroy.read_many(corpus,2,executor))
+    assert [path for path,result in results]==corpus
+    for path,result in results:
+        np.testing.assert_array_equal(result[3],lecroy.ReadBinaryTrace(path)[3])
+    results = lecroy.read_many(corpus,2,executor,ordered=False,mode='raw')
+    assert sorted(path for path,result in results)==sorted(corpus)
+#
+#
+@pytest.mark.parametrize('executor', ['thread','process'])
+def test_read_stacked(corpus, executor):
+    stacks = lecroy.read_stacked(corpus,2,executor,dtype='float32')
+    assert sorted(stacks)==[('C1','run'),('C2','run')]
+    paths, WAVEDESCS, y = stacks[('C2','run')]
+    assert y.shape==(3,100) and y.dtype==np.float32
+    for path,row in zip(paths,y):
+        np.testing.assert_allclose(row,lecroy.ReadBinaryTrace(path)[3],rtol=1e-6)
+#
+#
+# Catalog
+#
+def test_catalog(tmp_path):
+    directory = tmp_path / 'archive'
+    directory.mkdir()
+    for i,source in enumerate(('C1','C2','C1')):
+        makeTrace(str(directory / ('%s--run--%05d.trc' % (source,i))),np.arange(100,dtype='i2'),
+                  WAVE_SOURCE_INDEX=int(source[1])-1,TRIGGER_TIME_HOURS=10+i)
+    (directory / 'C3--bad--00000.trc').write_bytes(b'not a trace')
+    with lecroy.Catalog(str(tmp_path / 'catalog.db')) as catalog:
+        stats = catalog.update(str(directory))
+        assert (stats['added'],len(stats['errors']),stats['skipped'])==(3,1,0)
+        assert len(catalog)==3
+        assert [os.path.basename(p) for p in catalog.query(WAVE_SOURCE='C1')]==[
+            'C1--run--00000.trc','C1--run--00002.trc']
+        assert len(catalog.query(WAVE_SOURCE=['C1','C2']))==3
+        assert len(catalog.query(since='2026-10-16 11:00'))==2
+        assert catalog.header(str(directory / 'C2--run--00001.trc'))['WAVE_ARRAY_COUNT']==100
+        with pytest.raises(ValueError):
+            catalog.query(NOT_A_FIELD=1)
+        # Unchanged files, and files that could not be read, are not read again
+        stats = catalog.update(str(directory))
+        assert (stats['added'],stats['unchanged'],stats['errors'],stats['skipped'])==(0,3,[],1)
+        assert len(catalog.errors())==1
+        os.remove(str(directory / 'C3--bad--00000.trc'))
+        os.remove(str(directory / 'C1--run--00000.trc'))
+        stats = catalog.update(str(directory))
+        assert stats['removed']==1 and catalog.errors()==[]
+#
+#
+def test_catalog_broken_link(tmp_path):
+    directory = tmp_path / 'archive'
+    directory.mkdir()
+    makeTrace(str(directory / 'C1--a--00000.trc'),np.arange(100,dtype='i2'))
+    os.symlink(str(tmp_path / 'missing.trc'),str(directory / 'C2--a--00001.trc'))
+    with lecroy.Catalog(':memory:') as catalog:
+        stats = catalog.update(str(directory))
+        assert stats['added']==1 and len(catalog)==1
+        assert [os.path.basename(path) for path,message in stats['errors']]==['C2--a--00001.trc']
+        assert len(catalog.errors())==1
+        os.remove(str(directory / 'C2--a--00001.trc'))
+        catalog.update(str(directory))
+        assert catalog.errors()==[]
+#
+#
+# dtype and out
+#
+@pytest.mark.parametrize('y', [np.arange(-500,500,dtype='i2'),SEQUENCE], ids=['single','sequence'])
+def test_dtype_out(tmp_path, y):
+    filePath = str(tmp_path / 'trace.trc')
+    makeTrace(filePath,y,None if y.ndim==2 else -y,blocks=BLOCKS)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    W,T,x32,r1,r2 = lecroy.ReadBinaryTrace(filePath,dtype=np.float32)
+    assert r1.dtype==np.float32
+    np.testing.assert_allclose(r1,y1,atol=1e-6)
+    np.testing.assert_array_equal(x32,x)
+    W,T,x16,r1,r2 = lecroy.ReadBinaryTrace(filePath,dtype=np.int16)
+    assert r1.dtype==np.int16 and r1.flags.writeable
+    np.testing.assert_array_equal(r1,y)
+    out = np.empty(y.shape,dtype='float64')
+    result = lecroy.ReadBinaryTrace(filePath,out=out if y.ndim==2 else (out,np.empty_like(out)))
+    assert result[3] is out
+    np.testing.assert_allclose(out,y1,atol=1e-6)
+    if y.ndim==1: np.testing.assert_allclose(result[4],y2,atol=1e-6)
+    with pytest.raises(ValueError):
+        lecroy.ReadBinaryTrace(filePath,out=np.empty(3))
+#
+#
+def test_float16_offset(tmp_path):
+    # The offset is subtracted before the result is rounded to float16
+    filePath = str(tmp_path / 'offset.trc')
+    makeTrace(filePath,np.array([10001,10002,10003],dtype='i2'),VERTICAL_GAIN=0.01,VERTICAL_OFFSET=100)
+    y1 = lecroy.ReadBinaryTrace(filePath,dtype=np.float16)[3]
+    assert y1.dtype==np.float16
+    np.testing.assert_allclose(y1,[0.01,0.02,0.03],rtol=1e-3)
+    makeTrace(filePath,SEQUENCE+20000,VERTICAL_GAIN=0.01,VERTICAL_OFFSET=200)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    np.testing.assert_array_equal(lecroy.ReadBinaryTrace(filePath,dtype=np.float16)[3],y1.astype(np.float16))
+#
+#
+def test_int8_word(tmp_path):
+    # int8 cannot hold the samples of a word file
+    filePath = str(tmp_path / 'word.trc')
+    makeTrace(filePath,np.array([0,1000,-1000],dtype='i2'))
+    with pytest.raises(ValueError):
+        lecroy.ReadBinaryTrace(filePath,dtype=np.int8)
+    with pytest.raises(ValueError):
+        lecroy.ReadBinaryTrace(filePath,out=np.empty(3,dtype=np.uint16))
+#
+#
+def test_x_out(tmp_path):
+    filePath = str(tmp_path / 'sequence.trc')
+    makeTrace(filePath,SEQUENCE)
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    out = np.empty(y1.shape,dtype='float32')
+    x_out = np.empty(x.shape)
+    result = lecroy.ReadBinaryTrace(filePath,out=out,x_out=x_out)
+    assert result[2] is x_out and result[3] is out
+    np.testing.assert_array_equal(x_out,x)
+    interval, horOffset = lecroy.ReadBinaryTrace(filePath,out=out,x_out=False)[2]
+    np.testing.assert_allclose(horOffset,x[:,0])
+    with pytest.raises(ValueError):
+        lecroy.ReadBinaryTrace(filePath,x_out=np.empty(10))
+#
+#
+# Min/max pyramid
+#
+def test_envelope():
+    rng = np.random.default_rng(0)
+    y = rng.integers(-1000,1000,100000).astype('i2')
+    pyramid = lecroy.MinMaxPyramid(y,1e-9,0.0,gain=0.5,vertOffset=1.0,base=16,factor=4)
+    for n_pixels in (10,1000,100000):
+        t, lo, hi = pyramid.envelope(0.0,1e-4,n_pixels)
+        assert len(t)<=n_pixels
+        assert lo.min()==y.min()*0.5-1.0 and hi.max()==y.max()*0.5-1.0
+        assert np.all(lo<=hi)
+    # Pixels of a window hold the extrema of their samples
+    t, lo, hi = pyramid.envelope(0.9995e-6,2.0005e-6,1001)
+    np.testing.assert_array_equal(lo,y[1000:2001]*0.5-1.0)
+    t, lo, hi = pyramid.envelope(2e-6,1e-6,10)
+    assert len(t)==0
+#
+#
+def test_pyramid_cache(tmp_path):
+    filePath = str(tmp_path / 'pyramid.trc')
+    makeTrace(filePath,np.arange(10000,dtype='i2'))
+    mtime = os.path.getmtime(filePath)
+    pyramid = lecroy.build_pyramid(filePath)
+    cachePath = filePath+'.y1.minmax.npz'
+    assert os.path.exists(cachePath)
+    cached = lecroy.build_pyramid(filePath)
+    np.testing.assert_array_equal(cached.mins[0],pyramid.mins[0])
+    # A different trace with the same modification time is not taken from the cache
+    makeTrace(filePath,-np.arange(20000,dtype='i2'))
+    os.utime(filePath,(mtime,mtime))
+    pyramid = lecroy.build_pyramid(filePath)
+    np.testing.assert_array_equal(pyramid.mins[0][:2],[-63,-127])
+#
+#
+# Buffers and file objects
+#
+@pytest.mark.parametrize('y', [np.arange(-500,500,dtype='i2'),SEQUENCE], ids=['single','sequence'])
+def test_sources(tmp_path, y):
+    # bytes, bytearray, memoryview and file objects give the same result as the path
+    filePath = str(tmp_path / 'trace.trc')
+    data = makeTrace(filePath,y,None if y.ndim==2 else -y,text=b'text',blocks=BLOCKS)
+    expected = lecroy.ReadBinaryTrace(filePath)
+    for source in (data,bytearray(data),memoryview(data),io.BytesIO(data)):
+        result = lecroy.ReadBinaryTrace(source)
+        assert result[1]==b'text'
+        for a,b in zip(expected[2:],result[2:]):
+            np.testing.assert_array_equal(a,b)
+    np.testing.assert_array_equal(lecroy.ReadBinaryTrace(data,mode='raw')[3],y)
+    np.testing.assert_array_equal(lecroy.open(data).y1[:],expected[3])
+    assert lecroy.trace_length(data)==len(data)
+    with pytest.raises(RuntimeError):
+        lecroy.ReadBinaryTrace(data[:-1])
+#
+#
+# Scope acquisition
+#
+def test_fake_scope(tmp_path):
+    filePath = str(tmp_path / 'trace.trc')
+    y = np.arange(-5000,5000,dtype='i2')
+    makeTrace(filePath,y)
+    async def fetch():
+        async with lecroy.FakeScope({'C1':filePath,'C2':filePath},frame_size=4096) as scope:
+            async with await lecroy.ScopeClient.connect(scope.host,scope.port) as client:
+                idn = await client.query('*IDN?')
+                results = (await client.fetch(['C1','C2'],mode='raw')+
+                           await client.fetch(['C1'],pipeline=False,mode='raw'))
+                return idn, results
+    idn, results = asyncio.run(fetch())
+    assert idn
+    assert len(results)==3
+    for WAVEDESC,TEXT,x,y1,y2 in results:
+        np.testing.assert_array_equal(y1,y)
+#
+#
+def test_acquire(tmp_path):
+    filePath = str(tmp_path / 'trace.trc')
+    makeTrace(filePath,np.arange(1000,dtype='i2'))
+    async def run():
+        async with lecroy.FakeScope({'C1':filePath,'C2':filePath}) as scope:
+            queue = asyncio.Queue(maxsize=2)
+            task = asyncio.create_task(lecroy.acquire(scope.host,['C1','C2'],queue,port=scope.port,count=3))
+            items = [await queue.get() for i in range(6)]
+            await task
+            return items
+    items = asyncio.run(run())
+    assert [(n,channel) for n,channel,result in items]==[(n,c) for n in range(3) for c in ('C1','C2')]
+#
+#
+# Conversion
+#
+@pytest.mark.parametrize('format', ['hdf5','zarr','parquet'])
+def test_convert(tmp_path, format):
+    filePath = str(tmp_path / 'sequence.trc')
+    makeTrace(filePath,SEQUENCE)
+    dest = str(tmp_path / 'out')
+    if format=='hdf5':
+        h5py = pytest.importorskip('h5py')
+        stats = lecroy.convert(filePath,dest,format,executor='thread',chunk_points=1000)
+        with h5py.File(os.path.join(dest,'sequence.h5'),'r') as f:
+            y1, trigTime, columns = f['y1'][...], f['TRIGTIME'][...], list(f['TRIGTIME'].attrs['columns'])
+    elif format=='zarr':
+        zarr = pytest.importorskip('zarr')
+        stats = lecroy.convert(filePath,dest,format,executor='thread',chunk_points=1000)
+        root = zarr.open_group(os.path.join(dest,'sequence.zarr'),mode='r')
+        y1, trigTime, columns = root['y1'][...], root['TRIGTIME'][...], list(root['TRIGTIME'].attrs['columns'])
+    else:
+        pq = pytest.importorskip('pyarrow.parquet')
+        stats = lecroy.convert(filePath,dest,format,executor='thread',chunk_points=1000)
+        y1 = pq.read_table(os.path.join(dest,'sequence.parquet'))['y1'].to_numpy().reshape(50,100)
+        table = pq.read_table(os.path.join(dest,'sequence.TRIGTIME.parquet'))
+        columns = table.column_names
+        trigTime = np.column_stack([table[name].to_numpy() for name in columns])
+    assert stats['converted']==1 and stats['errors']==[]
+    np.testing.assert_array_equal(y1,SEQUENCE)
+    assert [str(c) for c in columns]==['TRIGGER_TIME','TRIGGER_OFFSET']
+    np.testing.assert_allclose(trigTime[:,0]+trigTime[:,1],np.arange(50)*1e-3-5e-7)
+    assert lecroy.convert(filePath,dest,format,executor='thread')['skipped']==1
+#
+#
+# Measurements
+#
+def test_measure(tmp_path):
+    # Ramps from 0 to 990 in 100 samples, delayed by k samples in segment k
+    y = np.clip((np.arange(200)[None,:]-np.arange(20)[:,None]-50)*10,0,990).astype('i2')
+    filePath = str(tmp_path / 'ramps.trc')
+    makeTrace(filePath,y,VERTICAL_GAIN=0.001,VERTICAL_OFFSET=0.0,trigTime=np.zeros((20,2)))
+    WAVEDESC,TEXT,x,y1,y2 = lecroy.ReadBinaryTrace(filePath)
+    result = lecroy.measure(y1,x)
+    np.testing.assert_allclose(result['amplitude'],0.99,rtol=1e-6)
+    np.testing.assert_allclose(result['rise_time'],79.2e-9,rtol=1e-4)
+    np.testing.assert_allclose(result['crossing'],(np.arange(20)+99.5)*1e-9,rtol=1e-4)
+    np.testing.assert_allclose(result['area'],[np.trapezoid(s,t) for s,t in zip(y1,x)],rtol=1e-6)
+    for name,values in lecroy.measure_file(filePath,block_segments=7,dtype='float64').items():
+        np.testing.assert_allclose(values,result[name],rtol=1e-6)
+    falling = lecroy.measure(-y1,x,edge='falling')
+    np.testing.assert_allclose(falling['rise_time'],result['rise_time'])
+#
+#
+# Writer and benchmark corpus
+#
+@pytest.fixture(params=SUITE_KINDS, ids=[kind[0] for kind in SUITE_KINDS])
+def trace(request, tmp_path):
+    """
+    Synthetic trace of each kind of the benchmark suite: (path, kind, y1, y2), where
+    y1, y2 are the raw samples that were written.
+    """
+    name,commType,commOrder,dual,segments = request.param
+    filePath = str(tmp_path / ('%s.trc' % name))
+    y1, y2 = writeSynthetic(filePath, 20000, commType, commOrder, dual, segments)
+    y1 = np.asarray(y1)
+    y2 = np.asarray(y2) if y2 is not None else None
+    return filePath, request.param, y1, y2
+#
+#
+def test_roundtrip(trace):
+    filePath,(name,commType,commOrder,dual,segments),y1,y2 = trace
+    WAVEDESC,TEXT,x,r1,r2 = lecroy.ReadBinaryTrace(filePath)
+    assert WAVEDESC['COMM_TYPE']==commType
+    assert WAVEDESC['COMM_ORDER']==commOrder
+    assert WAVEDESC['SUBARRAY_COUNT']==segments
+    assert r1.shape==y1.shape==x.shape
+    np.testing.assert_array_equal(r1,scaled(y1,WAVEDESC))
+    if dual: np.testing.assert_array_equal(r2,scaled(y2,WAVEDESC))
+    else: assert r2.size==0
+    np.testing.assert_allclose(x[...,1]-x[...,0],1e-9)
+    raw = lecroy.ReadBinaryTrace(filePath,mode='raw')
+    np.testing.assert_array_equal(raw[3],y1)
+    with open(filePath,'rb') as f:
+        np.testing.assert_array_equal(lecroy.ReadBinaryTrace(f.read())[3],r1)
+    chunks = list(lecroy.iter_chunks(filePath,chunk_points=777))
+    np.testing.assert_array_equal(np.concatenate([c for t,c in chunks]),r1.ravel())
+#
+#
+def test_rewrite(trace, tmp_path):
+    # A trace written from the header and samples of another one is identical
+    filePath,kind,y1,y2 = trace
+    WAVEDESC,TEXT,x,r1,r2 = lecroy.ReadBinaryTrace(filePath,mode='raw')
+    copyPath = str(tmp_path / 'copy.trc')
+    lecroy.WriteBinaryTrace(copyPath,r1,r2 if r2.size else None,WAVEDESC,TEXT)
+    with open(filePath,'rb') as a, open(copyPath,'rb') as b:
+        assert a.read()==b.read()
+#
+#
+def test_write_matches_reference(tmp_path):
+    # WriteBinaryTrace and makeTrace describe the same samples with the same header
+    y = np.arange(-100,100,dtype='i2')
+    makeTrace(str(tmp_path / 'a.trc'),y,-y,order='>',text=b'text')
+    WAVEDESC = lecroy.ReadWaveDesc(str(tmp_path / 'a.trc'))
+    lecroy.WriteBinaryTrace(str(tmp_path / 'b.trc'),y,-y,WAVEDESC,b'text')
+    assert lecroy.ReadWaveDesc(str(tmp_path / 'b.trc'))==WAVEDESC
+    for a,b in zip(lecroy.ReadBinaryTrace(str(tmp_path / 'a.trc'))[1:],lecroy.ReadBinaryTrace(str(tmp_path / 'b.trc'))[1:]):
+        np.testing.assert_array_equal(a,b)
+#
+#
+def test_write_range(tmp_path):
+    filePath = str(tmp_path / 'range.trc')
+    with pytest.raises(ValueError):
+        lecroy.WriteBinaryTrace(filePath,np.array([1000,-2000],dtype='i2'),COMM_TYPE='byte')
+    assert not os.path.exists(filePath)
+    lecroy.WriteBinaryTrace(filePath,np.array([100,-2,3]),COMM_TYPE='byte')
+    np.testing.assert_array_equal(lecroy.ReadBinaryTrace(filePath,mode='raw')[3],[100,-2,3])
+    with pytest.raises(ValueError):
+        lecroy.WriteBinaryTrace(filePath,np.array([0.5,1.5]))
+#
+#
+def test_write_template(tmp_path):
+    # COMM_TYPE and COMM_ORDER are taken from the template
+    filePath = str(tmp_path / 'template.trc')
+    lecroy.WriteBinaryTrace(filePath,np.array([1,-2,3],dtype='i2'),COMM_ORDER='HIFIRST')
+    WAVEDESC = lecroy.ReadWaveDesc(filePath)
+    lecroy.WriteBinaryTrace(filePath,np.array([1,-2,3],dtype='i1'),WAVEDESC=WAVEDESC)
+    WAVEDESC = lecroy.ReadWaveDesc(filePath)
+    assert (WAVEDESC['COMM_TYPE'],WAVEDESC['COMM_ORDER'])==('word','HIFIRST')
+#
+#
+def test_read_stats(trace):
+    filePath,kind,y1,y2 = trace
+    stats = lecroy.ReadStats()
+    for i in range(2):
+        lecroy.ReadBinaryTrace(filePath,stats=stats)
+    assert stats.traces==2
+    assert stats.bytes_read+stats.bytes_mapped>=2*y1.nbytes
+    assert all(seconds>=0 for seconds in stats.times.values())
+    assert sorted(stats.as_dict())==sorted(['traces','bytes_read','read_calls','bytes_mapped']+
+                                           ['time_'+stage for stage in lecroy.ReadStats.STAGES])